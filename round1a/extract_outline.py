@@ -8,113 +8,160 @@ import json
 import os
 import re
 import sys
-from typing import List, Dict, Tuple
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
-from collections import defaultdict
 import numpy as np
 
+# A text line reduced to what heading detection needs: the text plus the
+# size and flags of its dominant (longest) span
+Block = namedtuple('Block', 'text size flags page')
+
+# Plain text extraction: skip images and expand ligatures
+TEXT_FLAGS = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_IMAGES & ~fitz.TEXT_PRESERVE_LIGATURES
+
+# Documents shorter than this are read in-process; spinning up page
+# workers costs more than it saves
+PARALLEL_MIN_PAGES = 32
+
+# Pages per worker task, and tasks kept in flight per worker, when reading in
+# parallel; bounds how many pages' blocks the parent holds at once
+PAGES_PER_TASK = 16
+TASKS_PER_WORKER = 2
+
+# Leading numbering and bullet characters stripped from heading text
+HEADING_STRIP_CHARS = '0123456789.-*•'
+
 class PDFOutlineExtractor:
     def __init__(self):
         self.heading_patterns = {
-            'numbered': [
-                r'^\s*(\d+\.?)\s+(.+)$',  # 1. Introduction
-                r'^\s*(\d+\.\d+\.?)\s+(.+)$',  # 1.1 Overview
-                r'^\s*(\d+\.\d+\.\d+\.?)\s+(.+)$',  # 1.1.1 Details
-                r'^\s*([A-Z]\.?)\s+(.+)$',  # A. Section
-                r'^\s*([IVX]+\.?)\s+(.+)$',  # Roman numerals
-            ],
             'keywords': [
                 'introduction', 'conclusion', 'abstract', 'summary',
                 'chapter', 'section', 'overview', 'background',
                 'methodology', 'results', 'discussion', 'references'
             ]
         }
+        
+        # All numbering schemes in one anchored alternation; the index of
+        # the group that matched gives the heading level
+        self._numbered_re = re.compile(
+            r'^\s*(?:'
+            r'(\d+\.\d+\.\d+\.?)'  # 1.1.1 Details
+            r'|(\d+\.\d+\.?)'  # 1.1 Overview
+            r'|(\d+\.?)'  # 1. Introduction
+            r'|([A-Z]\.?)'  # A. Section
+            r'|([IVX]+\.?)'  # Roman numerals
+            r')\s+.+$'
+        )
+        self._numbered_levels = (0, 3, 2, 1, 1, 1)
+        self._keyword_set = frozenset(self.heading_patterns['keywords'])
+        # Any non-word character, including Unicode quotes and dashes, breaks words
+        self._word_break_re = re.compile(r'\W+')
     
-    def extract_text_with_formatting(self, page):
-        """Extract text blocks with formatting information"""
-        blocks = []
-        text_dict = page.get_text("dict")
+    def extract_text_with_formatting(self, page, size_chars):
+        """Yield a Block for each non-empty text line on the page
+        
+        Each span's text length is added to size_chars under its font size
+        (in tenths of a point) for the font statistics.
+        """
+        text_dict = page.get_text("dict", flags=TEXT_FLAGS)
+        page_number = page.number + 1
+        chars_for_size = size_chars.get
         
         for block in text_dict["blocks"]:
             if block["type"] == 0:  # Text block
                 for line in block["lines"]:
-                    line_text = ""
-                    line_info = {
-                        "bbox": line["bbox"],
-                        "spans": []
-                    }
+                    text_parts = []
+                    # Size and flags of the longest span
+                    best_len = -1
+                    best_size = 0.0
+                    best_flags = 0
                     
                     for span in line["spans"]:
-                        line_text += span["text"]
-                        line_info["spans"].append({
-                            "text": span["text"],
-                            "font": span["font"],
-                            "size": round(span["size"], 1),
-                            "flags": span["flags"]
-                        })
+                        span_text = span["text"]
+                        span_size = span["size"]
+                        span_len = len(span_text)
+                        text_parts.append(span_text)
+                        size_key = round(span_size * 10)
+                        size_chars[size_key] = chars_for_size(size_key, 0) + span_len
+                        if span_len > best_len:
+                            best_len = span_len
+                            best_size = span_size
+                            best_flags = span["flags"]
                     
-                    if line_text.strip():
-                        blocks.append({
-                            "text": line_text.strip(),
-                            "info": line_info,
-                            "page": page.number + 1
-                        })
-        
-        return blocks
+                    line_text = ''.join(text_parts).strip()
+                    if line_text:
+                        yield Block(line_text, round(best_size, 1), best_flags, page_number)
     
-    def calculate_font_statistics(self, blocks):
-        """Calculate font size statistics for the document"""
-        font_sizes = defaultdict(int)
-        
-        for block in blocks:
-            for span in block["info"]["spans"]:
-                size = span["size"]
-                font_sizes[size] += len(span["text"])
-        
-        # Find the most common font size (likely body text)
-        if font_sizes:
-            body_size = max(font_sizes.items(), key=lambda x: x[1])[0]
-            all_sizes = sorted(font_sizes.keys(), reverse=True)
-            
-            return {
-                "body_size": body_size,
-                "sizes": all_sizes,
-                "size_distribution": dict(font_sizes)
+    def calculate_font_statistics(self, size_chars):
+        """Calculate font size statistics from the size -> characters histogram"""
+        if not size_chars:
+            return None
+        
+        count = len(size_chars)
+        sizes = np.fromiter(size_chars.keys(), dtype=np.int32, count=count)
+        chars = np.fromiter(size_chars.values(), dtype=np.int64, count=count)
+        
+        # The most common font size (by characters) is likely body text
+        body_size = sizes[np.argmax(chars)] / 10.0
+        all_sizes = np.sort(sizes)[::-1]
+        
+        return {
+            "body_size": body_size,
+            "sizes": (all_sizes / 10.0).tolist(),
+            "size_distribution": {
+                size / 10.0: size_chars[size] for size in all_sizes.tolist()
             }
+        }
+    
+    def could_be_numbered(self, text):
+        """Cheap prefilter for the numbering regex
         
-        return None
+        The regex can only match text starting with a digit, a Roman numeral
+        or a letter followed by '.' or a space.
+        """
+        first = text[0]
+        return first.isdigit() or first in 'IVX' or (
+            first.isupper() and len(text) > 2 and (text[1] == '.' or text[1].isspace())
+        )
+    
+    def could_be_heading(self, text):
+        """Check whether is_likely_heading could accept text for any font statistics"""
+        return len(text) <= 200 and (
+            self.could_be_numbered(text) or len(text.split()) <= 10
+        )
     
     def is_likely_heading(self, block, font_stats):
         """Determine if a text block is likely a heading"""
-        text = block["text"]
+        text = block.text
         
         # Check if text is too long to be a heading
         if len(text) > 200:
             return False, 0
         
+        # Cheap checks first
+        maybe_numbered = self.could_be_numbered(text)
+        font_size = block.size
+        is_bold = block.flags & 2**4  # Bold flag
+        is_large = bool(font_stats) and font_size > font_stats["body_size"] * 1.2
+        
+        # Most body text lines stop here without touching the regex
+        if not (maybe_numbered or is_large or is_bold):
+            return False, 0
+        
         # Check for numbered patterns
-        for pattern in self.heading_patterns['numbered']:
-            if re.match(pattern, text):
-                # Determine level based on pattern
-                if '.' not in pattern or pattern.count('\.') == 1:
-                    level = 1
-                elif pattern.count('\.') == 2:
-                    level = 2
-                else:
-                    level = 3
-                return True, level
+        if maybe_numbered:
+            match = self._numbered_re.match(text)
+            if match:
+                return True, self._numbered_levels[match.lastindex]
         
         # Check font characteristics
-        if font_stats and block["info"]["spans"]:
-            main_span = max(block["info"]["spans"], key=lambda x: len(x["text"]))
-            font_size = main_span["size"]
-            is_bold = main_span["flags"] & 2**4  # Bold flag
-            
+        if font_stats:
             # Size-based detection with context
-            if font_size > font_stats["body_size"] * 1.2 or is_bold:
+            if is_large or is_bold:
                 # Check for keyword indicators
-                text_lower = text.lower()
-                has_keyword = any(kw in text_lower for kw in self.heading_patterns['keywords'])
+                words = self._word_break_re.split(text.lower())
+                has_keyword = not self._keyword_set.isdisjoint(words)
                 
                 # Determine level based on size
                 if font_size > font_stats["body_size"] * 1.5:
@@ -144,44 +191,84 @@ class PDFOutlineExtractor:
         title_candidate = None
         
         for block in first_page_blocks[:10]:  # Check first 10 blocks
-            if block["info"]["spans"]:
-                main_span = max(block["info"]["spans"], key=lambda x: len(x["text"]))
-                if main_span["size"] > max_size and len(block["text"]) < 150:
-                    max_size = main_span["size"]
-                    title_candidate = block["text"]
+            if block.size > max_size and len(block.text) < 150:
+                max_size = block.size
+                title_candidate = block.text
         
         return title_candidate or "Untitled Document"
     
-    def process_pdf(self, pdf_path):
+    def read_pages(self, doc, pdf_path, workers=1):
+        """Yield (blocks, size_chars) for each page in order
+        
+        With workers > 1, page ranges are read by separate processes that each
+        open their own document, as PyMuPDF objects must not be shared across
+        threads. Only a bounded number of ranges is in flight at a time, so the
+        caller still sees the document streamed.
+        """
+        page_count = doc.page_count
+        if workers > 1 and page_count >= PARALLEL_MIN_PAGES:
+            starts = iter(range(0, page_count, PAGES_PER_TASK))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                def submit_next():
+                    start = next(starts, None)
+                    if start is not None:
+                        job = (pdf_path, start, min(start + PAGES_PER_TASK, page_count))
+                        pending.append(executor.submit(_read_pages, job))
+                
+                pending = deque()
+                for _ in range(workers * TASKS_PER_WORKER):
+                    submit_next()
+                
+                while pending:
+                    pages = pending.popleft().result()
+                    submit_next()
+                    yield from pages
+            return
+        
+        for page in doc:
+            size_chars = {}
+            blocks = list(self.extract_text_with_formatting(page, size_chars))
+            yield blocks, size_chars
+    
+    def process_pdf(self, pdf_path, workers=1):
         """Main processing function"""
         try:
             doc = fitz.open(pdf_path)
-            all_blocks = []
+            size_chars = {}
+            candidate_blocks = []
+            first_page_blocks = []
             
-            # Extract all text blocks
-            for page_num, page in enumerate(doc):
-                blocks = self.extract_text_with_formatting(page)
-                all_blocks.extend(blocks)
+            # Stream pages once, keeping only a running font size histogram,
+            # the title candidates and the lines that could pass as headings
+            pages = self.read_pages(doc, pdf_path, workers)
+            for page_num, (blocks, page_size_chars) in enumerate(pages):
+                for block in blocks:
+                    if page_num == 0 and len(first_page_blocks) < 10:
+                        first_page_blocks.append(block)
+                    if self.could_be_heading(block.text):
+                        candidate_blocks.append(block)
+                
+                for size, chars in page_size_chars.items():
+                    size_chars[size] = size_chars.get(size, 0) + chars
             
             # Calculate font statistics
-            font_stats = self.calculate_font_statistics(all_blocks)
+            font_stats = self.calculate_font_statistics(size_chars)
             
             # Extract title from first page
-            first_page_blocks = [b for b in all_blocks if b["page"] == 1]
-            title = self.extract_title(all_blocks, first_page_blocks)
+            title = self.extract_title(candidate_blocks, first_page_blocks)
             
-            # Extract headings
+            # Extract headings; candidates are in page order, so the outline
+            # needs no sorting afterwards
             headings = []
             seen_headings = set()
             
-            for block in all_blocks:
+            for block in candidate_blocks:
                 is_heading, level = self.is_likely_heading(block, font_stats)
                 
                 if is_heading:
-                    heading_text = block["text"]
-                    # Clean heading text
-                    heading_text = re.sub(r'^\s*[\d\.\-\•\*]+\s*', '', heading_text)
-                    heading_text = heading_text.strip()
+                    # Clean heading text: drop one leading run of numbering
+                    # and the whitespace around it
+                    heading_text = block.text.lstrip().lstrip(HEADING_STRIP_CHARS).strip()
                     
                     # Avoid duplicates
                     if heading_text and heading_text not in seen_headings:
@@ -189,12 +276,9 @@ class PDFOutlineExtractor:
                         headings.append({
                             "level": f"H{level}",
                             "text": heading_text,
-                            "page": block["page"]
+                            "page": block.page
                         })
             
-            # Sort headings by page number
-            headings.sort(key=lambda x: x["page"])
-            
             doc.close()
             
             return {
@@ -213,18 +297,51 @@ class PDFOutlineExtractor:
         """Process all PDFs in the input directory"""
         os.makedirs(output_dir, exist_ok=True)
         
+        jobs = []
         for filename in os.listdir(input_dir):
             if filename.lower().endswith('.pdf'):
                 pdf_path = os.path.join(input_dir, filename)
                 output_path = os.path.join(output_dir, filename.replace('.pdf', '.json'))
-                
-                print(f"Processing {filename}...")
-                result = self.process_pdf(pdf_path)
-                
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, indent=2, ensure_ascii=False)
-                
-                print(f"Completed {filename}")
+                jobs.append((pdf_path, output_path))
+        
+        if not jobs:
+            return
+        
+        # Files are independent, so parse them in parallel across cores;
+        # cores left over when there are few files go to page-level workers
+        cpu_count = os.cpu_count() or 1
+        page_workers = max(1, cpu_count // len(jobs))
+        jobs = [(pdf_path, output_path, page_workers) for pdf_path, output_path in jobs]
+        with ProcessPoolExecutor(max_workers=cpu_count) as executor:
+            list(executor.map(_process_one, jobs))
+
+def _process_one(job):
+    """Process a single PDF and write its outline JSON (process pool worker)"""
+    pdf_path, output_path, page_workers = job
+    filename = os.path.basename(pdf_path)
+    
+    print(f"Processing {filename}...")
+    result = PDFOutlineExtractor().process_pdf(pdf_path, workers=page_workers)
+    
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    
+    print(f"Completed {filename}")
+
+def _read_pages(job):
+    """Extract blocks and font size histograms for a page range (process pool worker)"""
+    pdf_path, start, stop = job
+    extractor = PDFOutlineExtractor()
+    pages = []
+    
+    doc = fitz.open(pdf_path)
+    for page_num in range(start, stop):
+        size_chars = {}
+        blocks = list(extractor.extract_text_with_formatting(doc[page_num], size_chars))
+        pages.append((blocks, size_chars))
+    doc.close()
+    
+    return pages
 
 def main():
     extractor = PDFOutlineExtractor()
@@ -236,7 +353,7 @@ def main():
         # Local testing
         if len(sys.argv) > 1:
             pdf_path = sys.argv[1]
-            result = extractor.process_pdf(pdf_path)
+            result = extractor.process_pdf(pdf_path, workers=os.cpu_count() or 1)
             print(json.dumps(result, indent=2, ensure_ascii=False))
         else:
             print("Usage: python extract_outline.py <pdf_path>")
@@ -4,34 +4,88 @@ Persona-Driven Document Intelligence for Adobe Hackathon Round 1B
 Extracts and ranks relevant sections based on persona and job-to-be-done
 """
 import os
-os.environ['NLTK_DATA'] = '/usr/local/nltk_data'
-
-import nltk
-from nltk.tokenize import sent_tokenize
-
-nltk.data.path.append("/usr/local/nltk_data")
-
-
-
 import json
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Tuple
 import fitz  # PyMuPDF
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
 
+# all-MiniLM-L6-v2 saved locally and its int8 ONNX export, both produced
+# at Docker build time
+MODEL_DIR = "/app/model"
+ONNX_MODEL_DIR = "/app/model_onnx"
+QUANTIZED_MODEL_DIR = "/app/model_onnx_int8"
+
+# Sentence boundary: terminal punctuation followed by whitespace and a capital or quote
+_SENT_SPLIT = re.compile(r'(?<=[.!?])\s+(?=[A-Z"\'])')
+
+# Section header signals checked in extract_document_structure
+_HEADER_RE = re.compile(r'^\d+\.?\s+\w+')
+_HEADER_KEYWORDS = frozenset(('chapter', 'section', 'introduction', 'conclusion'))
+
+class QuantizedEncoder:
+    """ONNX Runtime int8 encoder with a SentenceTransformer-compatible encode()"""
+    def __init__(self, model_dir, tokenizer_dir):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_dir, file_name="model_quantized.onnx"
+        )
+    
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        """Encode text(s) into normalized sentence embeddings"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        
+        embeddings = []
+        for start in range(0, len(sentences), batch_size):
+            inputs = self.tokenizer(
+                sentences[start:start + batch_size], padding=True,
+                truncation=True, max_length=256, return_tensors="np"
+            )
+            token_embeddings = self.model(**inputs).last_hidden_state
+            
+            # Mean pooling + L2 normalization, as in the sentence-transformers pipeline
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            embeddings.append(pooled / np.linalg.norm(pooled, axis=1, keepdims=True))
+        
+        result = np.vstack(embeddings)
+        return result[0] if single else result
+
 class DocumentIntelligence:
     def __init__(self):
-        # Use a small, efficient model that fits within constraints
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Use a small, efficient model that fits within constraints; prefer
+        # the int8 quantized ONNX build, then the local copy, over the Hub
+        if os.path.isdir(QUANTIZED_MODEL_DIR):
+            self.model = QuantizedEncoder(QUANTIZED_MODEL_DIR, ONNX_MODEL_DIR)
+        else:
+            # Only the fallback path pays for importing sentence-transformers
+            import torch
+            from sentence_transformers import SentenceTransformer
+            
+            # Let intra-op BLAS use every core for the batched encodes; the
+            # inter-op pool can only be sized once per process
+            torch.set_num_threads(os.cpu_count() or 1)
+            if torch.get_num_interop_threads() != 1:
+                try:
+                    torch.set_num_interop_threads(1)
+                except RuntimeError:
+                    pass  # inter-op pool already started
+            
+            model_name = MODEL_DIR if os.path.isdir(MODEL_DIR) else 'all-MiniLM-L6-v2'
+            self.model = SentenceTransformer(model_name, device='cpu')
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
     
-    def extract_document_structure(self, pdf_path):
+    @staticmethod
+    def extract_document_structure(pdf_path):
         """Extract structured content from PDF"""
         doc = fitz.open(pdf_path)
         sections = []
@@ -39,34 +93,33 @@ class DocumentIntelligence:
         
         for page_num, page in enumerate(doc):
             text_dict = page.get_text("dict")
+            page_number = page_num + 1
             page_sections = []
             
             for block in text_dict["blocks"]:
                 if block["type"] == 0:  # Text block
-                    block_text = ""
-                    block_info = {
-                        "bbox": block["bbox"],
-                        "page": page_num + 1,
-                        "font_sizes": [],
-                        "is_bold": False
-                    }
+                    text_parts = []
+                    is_bold = False
+                    font_size_sum = 0.0
+                    font_size_count = 0
                     
                     for line in block["lines"]:
                         for span in line["spans"]:
-                            block_text += span["text"]
-                            block_info["font_sizes"].append(span["size"])
+                            text_parts.append(span["text"])
+                            font_size_sum += span["size"]
+                            font_size_count += 1
                             if span["flags"] & 2**4:  # Bold
-                                block_info["is_bold"] = True
+                                is_bold = True
                     
-                    block_text = block_text.strip()
+                    block_text = ''.join(text_parts).strip()
                     if block_text:
-                        # Determine if this is a section header
-                        avg_font_size = np.mean(block_info["font_sizes"]) if block_info["font_sizes"] else 0
+                        # Determine if this is a section header, cheapest signals first
+                        avg_font_size = font_size_sum / font_size_count if font_size_count else 0
                         is_header = (
                             (avg_font_size > 12 and len(block_text) < 100) or
-                            block_info["is_bold"] or
-                            re.match(r'^\d+\.?\s+\w+', block_text) or
-                            any(kw in block_text.lower() for kw in ['chapter', 'section', 'introduction', 'conclusion'])
+                            is_bold or
+                            _HEADER_RE.match(block_text) or
+                            DocumentIntelligence.has_header_keyword(block_text)
                         )
                         
                         if is_header and len(block_text.split()) < 15:
@@ -74,19 +127,19 @@ class DocumentIntelligence:
                                 sections.append(current_section)
                             current_section = {
                                 "title": block_text,
-                                "page": block_info["page"],
-                                "content": "",
+                                "page": page_number,
+                                "content": [],
                                 "subsections": []
                             }
                         else:
                             if current_section:
-                                current_section["content"] += " " + block_text
+                                current_section["content"].append(block_text)
                             else:
                                 # Create a default section if none exists
                                 current_section = {
-                                    "title": f"Page {block_info['page']}",
-                                    "page": block_info["page"],
-                                    "content": block_text,
+                                    "title": f"Page {page_number}",
+                                    "page": page_number,
+                                    "content": [block_text],
                                     "subsections": []
                                 }
         
@@ -97,13 +150,21 @@ class DocumentIntelligence:
         
         # Extract subsections from content
         for section in sections:
-            section["subsections"] = self.extract_subsections(section["content"])
+            section["content"] = " ".join(section["content"])
+            section["subsections"] = DocumentIntelligence.extract_subsections(section["content"])
         
         return sections
     
-    def extract_subsections(self, content):
+    @staticmethod
+    def has_header_keyword(text):
+        """Check whether text contains a section header keyword"""
+        text_lower = text.lower()
+        return any(kw in text_lower for kw in _HEADER_KEYWORDS)
+    
+    @staticmethod
+    def extract_subsections(content):
         """Extract meaningful subsections from section content"""
-        sentences = sent_tokenize(content)
+        sentences = [sent for sent in _SENT_SPLIT.split(content.strip()) if sent]
         subsections = []
         
         # Group sentences into paragraphs
@@ -117,7 +178,7 @@ class DocumentIntelligence:
                     if len(para_text.split()) > 10:  # Meaningful content
                         subsections.append({
                             "text": para_text,
-                            "summary": self.generate_summary(para_text)
+                            "summary": DocumentIntelligence.generate_summary(para_text, current_para)
                         })
                 current_para = []
         
@@ -127,34 +188,47 @@ class DocumentIntelligence:
             if len(para_text.split()) > 10:
                 subsections.append({
                     "text": para_text,
-                    "summary": self.generate_summary(para_text)
+                    "summary": DocumentIntelligence.generate_summary(para_text, current_para)
                 })
         
         return subsections
     
-    def generate_summary(self, text):
-        """Generate a concise summary of the text"""
+    @staticmethod
+    def generate_summary(text, sentences):
+        """Generate a concise summary of the text from its sentences"""
         words = text.split()
         if len(words) <= 30:
             return text
         
         # Simple extractive summary - take first and key sentences
-        sentences = sent_tokenize(text)
         if len(sentences) <= 2:
             return text
         
         # Return first sentence + most important middle sentence
         return sentences[0]
     
-    def calculate_relevance(self, section_embedding, query_embedding, persona_embedding):
-        """Calculate relevance score for a section"""
+    def encode_texts(self, texts):
+        """Encode texts in batches, running the model once per distinct text"""
+        unique_texts = list(dict.fromkeys(texts))
+        embeddings = self.model.encode(
+            unique_texts, batch_size=64,
+            convert_to_numpy=True, normalize_embeddings=True
+        )
+        if len(unique_texts) == len(texts):
+            return embeddings
+        
+        # Repeated boilerplate (e.g. "References") reuses the same embedding
+        index = {text: idx for idx, text in enumerate(unique_texts)}
+        return embeddings[[index[text] for text in texts]]
+    
+    def calculate_relevance(self, section_embeddings, query_embedding, persona_embedding):
+        """Calculate relevance scores for a batch of sections"""
         # Combine query and persona embeddings with weights
         combined_embedding = 0.7 * query_embedding + 0.3 * persona_embedding
+        combined_embedding /= np.linalg.norm(combined_embedding)
         
-        # Calculate cosine similarity
-        similarity = cosine_similarity([section_embedding], [combined_embedding])[0][0]
-        
-        return similarity
+        # Embeddings are normalized, so cosine similarity is a single matmul
+        return section_embeddings @ combined_embedding
     
     def process_documents(self, config):
         """Main processing function"""
@@ -162,66 +236,66 @@ class DocumentIntelligence:
         persona = config["persona"]
         job_to_be_done = config["job_to_be_done"]
         
-        # Create embeddings for persona and job
-        persona_text = f"{persona}"
-        persona_embedding = self.model.encode(persona_text)
-        job_embedding = self.model.encode(job_to_be_done)
-        
         all_sections = []
         all_subsections = []
+        section_texts = []
+        subsection_texts = []
+        
+        # Parse the PDFs in parallel; extraction does not touch the model
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            document_sections = list(executor.map(
+                DocumentIntelligence.extract_document_structure, documents
+            ))
         
         # Process each document
-        for doc_path in documents:
+        for doc_path, sections in zip(documents, document_sections):
             doc_name = os.path.basename(doc_path)
-            sections = self.extract_document_structure(doc_path)
             
             # Process sections
             for section in sections:
-                # Create section embedding
-                section_text = f"{section['title']} {section['content'][:500]}"
-                section_embedding = self.model.encode(section_text)
-                
-                # Calculate relevance
-                relevance = self.calculate_relevance(
-                    section_embedding, job_embedding, persona_embedding
-                )
-                
+                section_texts.append(f"{section['title']} {section['content'][:500]}")
                 all_sections.append({
                     "document": doc_name,
                     "page": section["page"],
                     "title": section["title"],
-                    "relevance": float(relevance),
                     "content_preview": section["content"][:200] + "..." if len(section["content"]) > 200 else section["content"]
                 })
                 
                 # Process subsections
                 for idx, subsection in enumerate(section["subsections"]):
-                    subsection_embedding = self.model.encode(subsection["summary"])
-                    sub_relevance = self.calculate_relevance(
-                        subsection_embedding, job_embedding, persona_embedding
-                    )
-                    
+                    subsection_texts.append(subsection["summary"])
                     all_subsections.append({
                         "document": doc_name,
                         "section_title": section["title"],
                         "page": section["page"],
                         "subsection_idx": idx,
-                        "refined_text": subsection["summary"],
-                        "relevance": float(sub_relevance)
+                        "refined_text": subsection["summary"]
                     })
         
-        # Sort by relevance and assign importance ranks
-        all_sections.sort(key=lambda x: x["relevance"], reverse=True)
-        all_subsections.sort(key=lambda x: x["relevance"], reverse=True)
+        # Create embeddings in batches rather than one forward pass per text
+        persona_text = f"{persona}"
+        persona_embedding, job_embedding = self.encode_texts([persona_text, job_to_be_done])
+        
+        if section_texts:
+            section_embeddings = self.encode_texts(section_texts)
+            relevance = self.calculate_relevance(
+                section_embeddings, job_embedding, persona_embedding
+            )
+            all_sections = [all_sections[i] for i in np.argsort(-relevance, kind='stable')]
+        
+        if subsection_texts:
+            subsection_embeddings = self.encode_texts(subsection_texts)
+            sub_relevance = self.calculate_relevance(
+                subsection_embeddings, job_embedding, persona_embedding
+            )
+            all_subsections = [all_subsections[i] for i in np.argsort(-sub_relevance, kind='stable')]
         
-        # Assign importance ranks
+        # Assign importance ranks in order of relevance
         for idx, section in enumerate(all_sections):
             section["importance_rank"] = idx + 1
-            del section["relevance"]  # Remove internal score
         
         for idx, subsection in enumerate(all_subsections):
             subsection["importance_rank"] = idx + 1
-            del subsection["relevance"]
         
         # Keep top relevant items
         top_sections = all_sections[:15]  # Top 15 sections